@@ -1,57 +1,91 @@
+import os
+import re
 import select
-from history import YTMCLIHistory
+from history import get_history
 from mpv_client import control, force_kill_vlc
 
-def handle_input(system_input, vlc_proc):
+def _quit(vlc_proc):
+    force_kill_vlc(vlc_proc)
+    return "quit"
+
+def _stop(vlc_proc):
+    # Just stop playback, return to CLI
+    force_kill_vlc(vlc_proc)
+    return "stop"
+
+def _delete_last(vlc_proc):
+    # Remove last from history (loaded on first use, not per keypress)
+    get_history().delete_last()
+
+# Keys mapped straight onto player controls (arrow keys arrive as escapes).
+# Volume and seek take a relative step, None means the control takes no value
+_ACTIONS = {
+    'i': ('volume', 10), '\x1b[A': ('volume', 10),
+    'o': ('volume', -10), '\x1b[B': ('volume', -10),
+    'l': ('seek', 5), '\x1b[C': ('seek', 5),
+    'k': ('seek', -5), '\x1b[D': ('seek', -5),
+    'p': ('pause', None),
+}
+
+# One key per match: arrow keys arrive as ESC [ X, everything else is one char
+_KEY_RE = re.compile(r'\x1b\[.|.', re.DOTALL)
+
+# Keys that do more than a control call; these return the loop's exit reason
+_SPECIAL = {
+    'q': _quit,
+    's': _stop,
+    'r': _delete_last,
+}
+
+def handle_input(system_input, vlc_proc, timeout=0):
     """
-    Handle a single keypress from the user.
+    Handle pending keypresses from the user.
 
     Parameters:
     - system_input: file-like object (e.g., sys.stdin) to read input from.
     - vlc_proc: VLC process instance to control playback.
+    - timeout: seconds to wait for a keypress (0 = just poll, None = the
+      caller already knows input is waiting).
 
     Behavior:
-    - Non-blocking: returns immediately if no input is available.
+    - Waits at most `timeout` seconds; a key is handled as soon as it arrives.
+    - Every key that is already waiting is handled in the same call; repeated
+      volume/seek steps (a held key) are summed into one command each.
     - Returns:
         - "quit" if user pressed q
         - "stop" if user pressed s
         - None otherwise
     """
-    history = YTMCLIHistory()
-
-    if select.select([system_input], [], [], 0)[0]:
-        key = system_input.read(1).lower()
-
-        # Arrow keys
-        if key == '\x1b':
-            key += system_input.read(2)
-            if key == '\x1b[A': control('volume_up')
-            elif key == '\x1b[B': control('volume_down')
-            elif key == '\x1b[C': control('seek', '+5')
-            elif key == '\x1b[D': control('seek', '-5')
-
-        # Quit
-        elif key == 'q':
-            force_kill_vlc(vlc_proc)
-            return "quit"
-
-        # Stop (just stop playback, return to CLI)
-        elif key == 's':
-            force_kill_vlc(vlc_proc)
-            return "stop"
+    fd = system_input.fileno()
+    if timeout is not None and not select.select([fd], [], [], timeout)[0]:
+        return None
 
-        # Volume
-        elif key == 'i': control('volume_up')
-        elif key == 'o': control('volume_down')
+    # Drain everything pending in one raw read; an escape sequence comes in
+    # whole instead of racing a second read for its last two bytes
+    data = os.read(fd, 64).decode(errors='ignore')
 
-        # Seek
-        elif key == 'l': control('seek', '+5')
-        elif key == 'k': control('seek', '-5')
+    steps = {}
+    for key in _KEY_RE.findall(data):
+        if len(key) == 1:
+            key = key.lower()
 
-        # Pause
-        elif key == 'p': control('pause')
+        action = _ACTIONS.get(key)
+        if action:
+            name, step = action
+            if step is None:
+                control(name)
+            else:
+                steps[name] = steps.get(name, 0) + step
+            continue
 
-        # Remove last from history
-        elif key == 'r': history.delete_last()
+        special = _SPECIAL.get(key)
+        if special:
+            reason = special(vlc_proc)
+            if reason:
+                return reason
 
+    # One round-trip per control for the whole burst, not one per key
+    for name, total in steps.items():
+        if total:
+            control(name, f'{total:+d}')
     return None
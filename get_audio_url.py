@@ -1,50 +1,282 @@
 #!/usr/bin/env python3
+import os
+import queue
+import select
+import sqlite3
 import subprocess
-import json
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from concurrent.futures import Future
+
+# Result of a lookup; fields that could not be resolved are None
+TrackInfo = namedtuple("TrackInfo", "url title duration")
+_NOT_FOUND = TrackInfo(None, None, None)
+
+# --------------------------------------------------
+# Result cache (query → url/title/duration)
+# --------------------------------------------------
+CACHE_FILE = os.path.expanduser("~/.ytmcli/cache.sqlite")
+CACHE_TTL = 5 * 60 * 60  # YouTube stream URLs expire after ~6h
+
+# Recent results are also kept in memory in front of the database
+MEMO_SIZE = 128
+
+_cache_db = None
+_cache_lock = threading.Lock()
+_memo = OrderedDict()  # query -> (expiry, TrackInfo), least recently used first
+
+def _get_cache():
+    """Open the cache database once per process"""
+    global _cache_db
+    if _cache_db is None:
+        os.makedirs(os.path.dirname(CACHE_FILE), exist_ok=True)
+        db = sqlite3.connect(CACHE_FILE, check_same_thread=False)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("CREATE TABLE IF NOT EXISTS cache("
+                   "q TEXT PRIMARY KEY, url TEXT, title TEXT, duration INT, expiry INT)")
+        _cache_db = db
+    return _cache_db
+
+def _remember(query, info, expiry):
+    """Keep a result in the in-memory LRU; caller holds _cache_lock"""
+    _memo[query] = (expiry, info)
+    _memo.move_to_end(query)
+    if len(_memo) > MEMO_SIZE:
+        _memo.popitem(last=False)
+
+def _cache_get(query):
+    now = int(time.time())
+    with _cache_lock:
+        hit = _memo.get(query)
+        if hit is not None and hit[0] > now:
+            _memo.move_to_end(query)
+            return hit[1]
+        try:
+            row = _get_cache().execute(
+                "SELECT url, title, duration, expiry FROM cache WHERE q = ? AND expiry > ?",
+                (query, now)
+            ).fetchone()
+        except sqlite3.Error:
+            return None
+        if row is None:
+            return None
+        info = TrackInfo(*row[:3])
+        _remember(query, info, row[3])
+        return info
+
+def _cache_put(query, info):
+    expiry = int(time.time()) + CACHE_TTL
+    with _cache_lock:
+        _remember(query, info, expiry)
+        try:
+            with _get_cache() as db:
+                db.execute("INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?, ?)",
+                           (query, *info, expiry))
+        except sqlite3.Error:
+            pass
+
+def _cache_delete(query):
+    with _cache_lock:
+        _memo.pop(query, None)
+        try:
+            with _get_cache() as db:
+                db.execute("DELETE FROM cache WHERE q = ?", (query,))
+        except sqlite3.Error:
+            pass
+
+def _parse_duration(value):
+    """yt-dlp prints NA for unknown fields and may print floats"""
+    try:
+        return int(float(value))
+    except ValueError:
+        return None
+
+# A yt-dlp command that hasn't answered by then is given up on
+YT_DLP_TIMEOUT = 30
+
+def _read_first_line(stream, timeout):
+    """First line of stream, or b'' if it doesn't arrive within timeout"""
+    fd = stream.fileno()
+    deadline = time.monotonic() + timeout
+    data = b''
+    while b'\n' not in data:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0 or not select.select([fd], [], [], remaining)[0]:
+            return b''
+        chunk = os.read(fd, 65536)
+        if not chunk:
+            break
+        data += chunk
+    return data.split(b'\n', 1)[0]
+
+# yt-dlp commands in flight, so they can be stopped on exit
+_procs = set()
+_procs_lock = threading.Lock()
+
+def _terminate_lookups():
+    """Stop every running yt-dlp command; its lookup comes back empty"""
+    with _procs_lock:
+        for proc in _procs:
+            proc.terminate()
+
+def _run_yt_dlp(query):
+    """Search YouTube and return its TrackInfo"""
+    # Let yt-dlp pick the audio-only format and print just the fields we
+    # need instead of dumping (and parsing) the whole info JSON. Output stays
+    # bytes, and close_fds=False skips the fd sweep before exec (our fds are
+    # non-inheritable anyway)
+    with subprocess.Popen(
+        ["yt-dlp", "--extractor-args", "youtube:player_client=android_music",
+         "-f", "bestaudio[acodec!=none][vcodec=none]",
+         "--print", "%(url)s\t%(title)s\t%(duration)s", f"ytsearch:{query}"],
+        stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, close_fds=False
+    ) as proc:
+        with _procs_lock:
+            _procs.add(proc)
+        try:
+            # The answer is the first line; don't wait for yt-dlp to wind
+            # down, nor forever for one that has stalled
+            line = _read_first_line(proc.stdout, YT_DLP_TIMEOUT).strip()
+        finally:
+            with _procs_lock:
+                _procs.discard(proc)
+        proc.terminate()
+
+    if not line:
+        return _NOT_FOUND
+
+    url, rest = line.split(b'\t', 1)
+    title, duration = rest.rsplit(b'\t', 1)
+    return TrackInfo(
+        url.decode() if url != b'NA' else None,
+        title.decode(errors='replace') if title != b'NA' else None,
+        _parse_duration(duration),
+    )
+
+# --------------------------------------------------
+# In-process yt-dlp (no interpreter startup per query)
+# --------------------------------------------------
+class _SilentLogger:
+    """Swallow yt-dlp's messages, like stderr=DEVNULL does for the command"""
+    def debug(self, msg):
+        pass
+    info = warning = error = debug
+
+_YDL_OPTIONS = {
+    'format': 'bestaudio[acodec!=none][vcodec=none]',
+    'quiet': True,
+    'no_warnings': True,
+    'logger': _SilentLogger(),
+    'skip_download': True,
+    'extractor_args': {'youtube': {'player_client': ['android_music']}},
+}
+
+# YoutubeDL isn't thread-safe, so each thread gets its own rather than
+# sharing one behind a lock: a prefetch must not hold up the user's query
+_ydl_local = threading.local()
+
+def _extract_in_process(query):
+    """
+    Same lookup as _run_yt_dlp through the yt_dlp module.
+    Returns None if yt_dlp isn't importable (only the CLI is installed).
+    """
+    ydl = getattr(_ydl_local, 'ydl', None)
+    if ydl is None:
+        try:
+            from yt_dlp import YoutubeDL
+            ydl = YoutubeDL(_YDL_OPTIONS)
+        except ImportError:
+            ydl = False
+        _ydl_local.ydl = ydl
+    if not ydl:
+        return None
+
+    info = ydl.extract_info(f"ytsearch:{query}", download=False)
+
+    entries = info.get('entries') or []
+    if not entries:
+        return _NOT_FOUND
+    entry = entries[0]
+    duration = entry.get('duration')
+    return TrackInfo(
+        entry.get('url'),
+        entry.get('title'),
+        int(duration) if duration is not None else None,
+    )
 
 # --------------------------------------------------
 # YouTube URL fetching (search → bestaudio URL (+ title/duration))
 # --------------------------------------------------
-def get_audio_url(query, with_title=False, with_duration=False):
+def get_audio_url(query):
     """
-    Runs yt-dlp with android_music extractor and returns a tuple:
-      (url, title, duration)
-    Any of title/duration will be None if not requested.
+    Runs yt-dlp with android_music extractor (bestaudio, audio-only) and returns
+    a TrackInfo(url, title, duration); any field may be None.
+    Uses the yt_dlp module when installed, the yt-dlp command otherwise.
+    Results are cached on disk until the stream URL is about to expire.
     """
     try:
-        result = subprocess.run(
-            ["yt-dlp", "--extractor-args", "youtube:player_client=android_music",
-             "-f", "bestaudio", "-j", f"ytsearch:{query}"],
-            capture_output=True, text=True
-        )
-        info = json.loads(result.stdout or "null")
-
-        if not info:
-            return (None, None, None) if (with_title or with_duration) else None
-
-        url = None
-        for fmt in info.get('formats', []):
-            if fmt.get('acodec') != 'none' and fmt.get('vcodec') == 'none':
-                url = fmt.get('url')
-                break
-
-        title = info.get('title') if with_title else None
-        duration = info.get('duration') if with_duration else None
-
-        if not url:
-            return (None, title, duration) if (with_title or with_duration) else None
-
-        if with_title and with_duration:
-            return (url, title, duration)
-        if with_title:
-            return (url, title)
-        if with_duration:
-            return (url, duration)
-        return url
+        cached = _cache_get(query)
+        if cached:
+            return cached
+
+        info = _extract_in_process(query)
+        if info is None:
+            info = _run_yt_dlp(query)
+        if info.url:
+            _cache_put(query, info)
+        return info
 
     except Exception:
-        if with_title and with_duration:
-            return (None, None, None)
-        if with_title or with_duration:
-            return (None, None)
-        return None
+        return _NOT_FOUND
+
+
+class Prefetcher:
+    """
+    Resolves queries on a background thread so the URL is ready by the time
+    the query is actually played.
+    """
+    def __init__(self):
+        self._queue = queue.SimpleQueue()
+        self._worker = None
+        self._pending = {}
+
+    def _work(self):
+        """Worker thread: resolve queued queries one at a time"""
+        while True:
+            query, future = self._queue.get()
+            if future.set_running_or_notify_cancel():
+                future.set_result(get_audio_url(query))
+
+    def prefetch(self, query):
+        """Start resolving query in the background"""
+        if self._worker is None:
+            # A daemon thread, unlike an executor's workers, isn't joined at
+            # exit, so quitting never waits for a speculative lookup
+            self._worker = threading.Thread(target=self._work, daemon=True)
+            self._worker.start()
+        # Finished lookups are in the disk cache already, no need to hold them
+        self._pending = {q: f for q, f in self._pending.items() if not f.done()}
+        if query not in self._pending:
+            future = Future()
+            self._pending[query] = future
+            self._queue.put((query, future))
+
+    def get(self, query):
+        """Same as get_audio_url(query), reusing an in-flight prefetch"""
+        future = self._pending.pop(query, None)
+        if future is not None:
+            return future.result()
+        return get_audio_url(query)
+
+    def forget(self, query):
+        """Drop query's result, cached or prefetched (e.g. its URL is dead)"""
+        self._pending.pop(query, None)
+        _cache_delete(query)
+
+    def close(self):
+        """Drop queued lookups and stop a yt-dlp command that is running"""
+        for future in self._pending.values():
+            future.cancel()
+        self._pending = {}
+        _terminate_lookups()
@@ -1,4 +1,6 @@
+import atexit
 import os
+from collections import OrderedDict
 
 class YTMCLIHistory:
     def __init__(self, max_entries=100):
@@ -9,36 +11,80 @@ class YTMCLIHistory:
 
     def _load(self):
         if not os.path.exists(self.history_file):
-            self.entries = []
+            lines = []
         else:
             with open(self.history_file, "r") as f:
-                self.entries = [line.strip() for line in f.readlines() if line.strip()]
+                lines = [line.strip() for line in f.readlines() if line.strip()]
+
+        # Ordered set of entries, oldest first. The file is append-only, so a
+        # replayed entry shows up more than once: keep its latest position
+        self.entries = OrderedDict()
+        for line in lines:
+            self.entries.pop(line, None)
+            self.entries[line] = None
+        self._trim()
+        self._file_lines = len(lines)
+
+    def _trim(self):
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
 
     def add(self, entry: str):
-        if entry in self.entries:
-            self.entries.remove(entry)  # move to the end
-        self.entries.append(entry)
-        self.entries = self.entries[-self.max_entries:]
-        self._save()
+        self.entries.pop(entry, None)  # move to the end
+        self.entries[entry] = None
+        self._trim()
+        self._append(entry)
+
+    def _append(self, entry: str):
+        """Append a single line instead of rewriting the whole file"""
+        with open(self.history_file, "a") as f:
+            f.write(entry + "\n")
+        self._file_lines += 1
+
+        # Compact once duplicates/evicted lines pile up
+        if self._file_lines > 2 * self.max_entries:
+            self.flush()
 
     def delete_last(self):
         """Remove the most recent entry from history."""
         if self.entries:
-            removed = self.entries.pop()
-            self._save()
+            removed, _ = self.entries.popitem(last=True)
+            self.flush()
             return removed
         return None
 
-    def _save(self):
-        with open(self.history_file, "w") as f:
+    def flush(self):
+        """Rewrite the file from memory if it holds stale lines"""
+        # Appends keep the file in sync line for line; only duplicates,
+        # evictions and deletions leave it longer than the entries
+        if self._file_lines == len(self.entries):
+            return
+
+        # Write aside and rename so a crash never leaves a half-written file
+        tmp_file = self.history_file + ".tmp"
+        with open(tmp_file, "w") as f:
             f.write("\n".join(self.entries) + "\n")
+        os.replace(tmp_file, self.history_file)
+        self._file_lines = len(self.entries)
 
     def all(self):
         return list(self.entries)
 
 
+# Shared instance so every module sees the same entries
+_history = None
+
+def get_history():
+    """Return the process-wide history, compacted on exit"""
+    global _history
+    if _history is None:
+        _history = YTMCLIHistory()
+        atexit.register(_history.flush)
+    return _history
+
+
 # Example usage:
-# history = YTMCLIHistory()
+# history = get_history()
 # history.add("never gonna give you up")
 # print(history.delete_last())  # removes and returns the last entry
 # print(history.all())
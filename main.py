@@ -1,74 +1,72 @@
 #!/usr/bin/env python3
 import sys
-import threading
 import random
-import time
 from colorama import init, Fore, Style
-from get_audio_url import get_audio_url
-from mpv_client import start_player, force_kill_player, get_status, wait_for_player_ready, control
+from get_audio_url import Prefetcher
+from mpv_client import start_player, force_kill_player, stop_player, wait_for_player_ready, wait_for_playback, control
 from screen import draw_screen
-from history import YTMCLIHistory
+from history import YTMCLIHistory, get_history
 
 init(autoreset=True)
 
+# Static UI strings, colored once at import instead of on every prompt
+BANNER = Fore.CYAN + Style.BRIGHT + "♫ YTMCLI - YouTube Music CLI"
+RULE = Fore.MAGENTA + "----------------------------------"
+HINT = Fore.CYAN + "Press 'q' to quit, or Ctrl+C"
+PROMPT = Fore.YELLOW + Style.BRIGHT + "♫ Enter song > " + Style.RESET_ALL
+SEARCHING_FMT = (Fore.CYAN + "Searching for: {}").format
+FOUND_FMT = (Fore.GREEN + "Found: {}").format
+HELP_TEXT = "\n".join([
+    Fore.CYAN + Style.BRIGHT + "Available commands:" + Style.RESET_ALL,
+    Fore.YELLOW + ":r" + Style.RESET_ALL + " - Play a random song from history",
+    Fore.YELLOW + ":l" + Style.RESET_ALL + " - List last 20 history entries",
+    Fore.YELLOW + ":<number>" + Style.RESET_ALL + " - Play the nth last entry from history",
+    Fore.YELLOW + ":h" + Style.RESET_ALL + " - Show this help message",
+])
+
+# Resolves the next ':r' pick while the current song plays
+_prefetcher = Prefetcher()
+_next_random = None
+
 def handle_playback(player_proc, title=None):
     """
-    Starts the visualizer thread and waits for player playback.
+    Runs the playback screen on the calling thread until the song ends.
     Returns True if playback was stopped by user (q or Ctrl+C), False otherwise.
     """
     stopped_by_user = False
     exit_reason = ""
     
-    def screen_runner():
-        nonlocal exit_reason
-        nonlocal stopped_by_user
-        try:
-            error = draw_screen(player_proc, title)
-            if error:
-                exit_reason = error
-                stopped_by_user = True
-        except KeyboardInterrupt:
-            exit_reason = "exit"
-            stopped_by_user = True
-    
-    # Give player a moment to initialize and wait for interface
-    time.sleep(0.5)
-    
-    # Wait for interface to be ready
+    # Wait for interface to be ready, then for the track to start
     if wait_for_player_ready(max_wait=3):
-        initial_status = get_status()
-        print(Fore.GREEN + f"Player interface ready. Status: {initial_status}")
+        status = wait_for_playback()
+        print(Fore.GREEN + f"Player interface ready. Status: {status}")
         
         # If player is stopped, try to start playback
-        if initial_status and initial_status.get('state') == 'stopped':
+        if status and status.get('state') == 'stopped':
             print(Fore.YELLOW + "Player is stopped, sending play command...")
             control('play')
-            time.sleep(0.5)  # Give it a moment to start
             
             # Check status again
-            updated_status = get_status()
-            if updated_status:
-                print(Fore.CYAN + f"Updated status: {updated_status}")
+            status = wait_for_playback()
+            if status:
+                print(Fore.CYAN + f"Updated status: {status}")
+
+        # mpv just goes idle on a URL it can't open (e.g. an expired stream),
+        # which would otherwise pass for the song finishing right away
+        if not status or status.get('state') not in ('playing', 'paused'):
+            print(Fore.RED + "Playback did not start (the stream URL may have expired)")
+            return True, "failed"
     else:
         print(Fore.RED + "Warning: Could not connect to player interface within 3 seconds")
     
-    screen_thread = threading.Thread(target=screen_runner, daemon=True)
-    screen_thread.start()
-    
     try:
-        # Monitor player process
-        start_time = time.time()
-        while player_proc.poll() is None:
-            time.sleep(0.1)
-            
-            # Check if player has been running for a reasonable amount of time
-            if time.time() - start_time > 1:
-                status = get_status()
-                if status and status.get('state') == 'stopped':
-                    print(Fore.YELLOW + "Player reports stopped state")
-                    break
-                    
-        # Player process has ended
+        # The screen loop polls input, redraws and watches for the end of
+        # the track, so no extra threads are needed
+        error = draw_screen(player_proc, title)
+        if error:
+            exit_reason = error
+            stopped_by_user = True
+        
         return_code = player_proc.poll()
         print(Fore.CYAN + f"Player process ended with return code: {return_code}")
         
@@ -81,33 +79,43 @@ def handle_playback(player_proc, title=None):
         force_kill_player(player_proc)
         stopped_by_user = True
         exit_reason = "interrupt"
-    finally:
-        # Wait for screen thread to finish
-        if screen_thread.is_alive():
-            screen_thread.join(timeout=1)
     
     return stopped_by_user, exit_reason
 
+def prefetch_random(history: YTMCLIHistory):
+    """Draw the next ':r' song now and start resolving its URL in the background"""
+    global _next_random
+    entries = history.all()
+    if entries:
+        _next_random = random.choice(entries)
+        _prefetcher.prefetch(_next_random)
+
+def take_random(entries):
+    """Return the pre-drawn ':r' song if it is still in history"""
+    global _next_random
+    pick, _next_random = _next_random, None
+    if pick in entries:
+        return pick
+    return random.choice(entries)
+
 def resolve_special_query(query: str, history: YTMCLIHistory):
+    # Plain searches are the common case, don't copy the history for them
+    if not query.startswith(":"):
+        return query
     entries = history.all()
-    if not query.startswith(":") or not entries:
+    if not entries:
         return query
     
     cmd = query[1:]
     if cmd == "r":
-        return random.choice(entries)
+        return take_random(entries)
     
     if cmd == "l":
-        for i, entry in enumerate(entries[-20:][::-1], 1):
-            print(f"{i}: {entry}")
+        print("\n".join(f"{i}: {entry}" for i, entry in enumerate(reversed(entries[-20:]), 1)))
         return None
     
     if cmd == "h":
-        print(Fore.CYAN + Style.BRIGHT + "Available commands:")
-        print(Fore.YELLOW + ":r" + Style.RESET_ALL + " - Play a random song from history")
-        print(Fore.YELLOW + ":l" + Style.RESET_ALL + " - List last 20 history entries")
-        print(Fore.YELLOW + ":<number>" + Style.RESET_ALL + " - Play the nth last entry from history")
-        print(Fore.YELLOW + ":h" + Style.RESET_ALL + " - Show this help message")
+        print(HELP_TEXT)
         return None
     
     if cmd.isdigit():
@@ -118,7 +126,7 @@ def resolve_special_query(query: str, history: YTMCLIHistory):
     return query
 
 def play(is_cli, *args):
-    history = YTMCLIHistory()
+    history = get_history()
     
     if not is_cli:
         query = " ".join(args)
@@ -127,16 +135,18 @@ def play(is_cli, *args):
             return
         
         try:
-            print(Fore.CYAN + f"Searching for: {query}")
-            result = get_audio_url(query, with_title=True, with_duration=True)
-            if result and result[0]:
+            print(SEARCHING_FMT(query))
+            result = _prefetcher.get(query)
+            if result.url:
                 url, title, duration = result
-                print(Fore.GREEN + f"Found: {title}")
+                print(FOUND_FMT(title))
                 print(Fore.BLUE + f"Duration: {duration}s")
                 print(Fore.BLUE + f"URL: {url[:100]}...")
                 history.add(query)
                 player_proc = start_player(url)
-                handle_playback(player_proc, title)
+                stopped, exit_reason = handle_playback(player_proc, title)
+                if exit_reason == "failed":
+                    _prefetcher.forget(query)  # don't serve the dead URL again
             else:
                 print(Fore.RED + "No audio URL found")
         except Exception as e:
@@ -145,13 +155,16 @@ def play(is_cli, *args):
             traceback.print_exc()
         return
     
-    print(Fore.CYAN + Style.BRIGHT + "♫ YTMCLI - YouTube Music CLI")
-    print(Fore.MAGENTA + "----------------------------------")
-    print(Fore.CYAN + "Press 'q' to quit, or Ctrl+C")
+    print(BANNER)
+    print(RULE)
+    print(HINT)
+
+    # Resolve a ':r' pick (and warm up yt-dlp) while the user is still typing
+    prefetch_random(history)
     
     while True:
         try:
-            query = input(Fore.YELLOW + Style.BRIGHT + "♫ Enter song > " + Style.RESET_ALL)
+            query = input(PROMPT)
         except (EOFError, ValueError, KeyboardInterrupt):
             print()
             break
@@ -167,31 +180,22 @@ def play(is_cli, *args):
             continue  # special command handled (don't use command as actual query)
         
         try:
-            print(Fore.CYAN + f"Searching for: {query}")
-            result = get_audio_url(query, with_title=True, with_duration=True)
+            print(SEARCHING_FMT(query))
+            result = _prefetcher.get(query)
             
-            if result and result[0]:  # Check if we got a valid result
+            if result.url:  # Check if we got a valid result
                 url, title, duration = result
-                print(Fore.GREEN + f"Found: {title}")
+                print(FOUND_FMT(title))
                 if duration:
                     print(Fore.BLUE + f"Duration: {duration}s")
                 
-                # Test if URL is accessible (quick check)
-                try:
-                    import requests
-                    response = requests.head(url, timeout=3)
-                    if response.status_code not in [200, 206]:  # 206 is partial content, common for media
-                        print(Fore.RED + f"URL may be invalid (status: {response.status_code})")
-                        continue
-                    print(Fore.GREEN + "URL is accessible")
-                except Exception as e:
-                    print(Fore.YELLOW + f"Could not verify URL accessibility: {e}")
-                    # Continue anyway, might still work
-                
+                # No up-front HEAD check: it cost a full round-trip to the
+                # media host, and mpv simply goes idle on a dead URL
                 print(Fore.BLUE + f"URL: {url[:100]}...")
                 
                 history.add(query)
                 player_proc = start_player(url)
+                prefetch_random(history)
                 
                 # Wait for player interface to be ready
                 if not wait_for_player_ready(max_wait=3):
@@ -202,7 +206,6 @@ def play(is_cli, *args):
                 # Send play command to start playback
                 print(Fore.CYAN + "Starting playback...")
                 control('play')
-                time.sleep(0.5)  # Give player time to start playing
                 
                 stopped, exit_reason = handle_playback(player_proc, title)
                 
@@ -216,6 +219,10 @@ def play(is_cli, *args):
                     elif exit_reason == "interrupt":
                         print(Fore.YELLOW + "Playback interrupted")
                         continue
+                    elif exit_reason == "failed":
+                        # Don't serve the dead URL again from the cache
+                        _prefetcher.forget(query)
+                        continue
                 else:
                     print(Fore.GREEN + "Song completed")
             else:
@@ -227,6 +234,14 @@ def play(is_cli, *args):
             traceback.print_exc()
             continue
 
+def shutdown():
+    """Tear down what outlives a single song: the idle player and prefetches"""
+    stop_player()
+    _prefetcher.close()
+
 if __name__ == "__main__":
     is_cli = (len(sys.argv) == 1)
-    play(is_cli, *sys.argv[1:])
\ No newline at end of file
+    try:
+        play(is_cli, *sys.argv[1:])
+    finally:
+        shutdown()
\ No newline at end of file
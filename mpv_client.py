@@ -7,29 +7,54 @@ import json
 import socket
 import time
 import os
+import shutil
 import threading
 import tempfile
 
+# orjson is optional: faster and works in bytes, which is what the socket wants
+try:
+    import orjson
+
+    def _dump_line(obj):
+        return orjson.dumps(obj) + b'\n'
+
+    _loads = orjson.loads
+except ImportError:
+    def _dump_line(obj):
+        return (json.dumps(obj) + '\n').encode()
+
+    _loads = json.loads
+
+# Properties get_status reports; mpv pushes their changes to us
+_STATUS_PROPERTIES = ("pause", "time-pos", "duration", "volume")
+
 class MPVClient:
     def __init__(self):
         self.process = None
         self.socket_path = None
+        self._socket_dir = None
         self._socket_lock = threading.Lock()
+        self._sock = None
+        self._next_id = 0
+        self._replies = {}  # request_id -> [Event, reply] for the open connection
+        self._props = {}    # latest value of each observed property
+        self._props_changed = threading.Condition()
         
     def start(self, url):
         """Start MPV with IPC interface"""
         if self.process and self.process.poll() is None:
             self.stop()
         
-        # Create unique socket path
-        fd, self.socket_path = tempfile.mkstemp(suffix='.sock', prefix='mpv_')
-        os.close(fd)  # We don't need the file descriptor
-        os.unlink(self.socket_path)  # Remove the temp file, we just want the path
+        # Socket goes in a private directory of its own, so nobody can take
+        # the name before mpv binds it
+        self._socket_dir = tempfile.mkdtemp(prefix='mpv_')
+        self.socket_path = os.path.join(self._socket_dir, 'ipc.sock')
         
         try:
             self.process = subprocess.Popen([
                 "mpv",
                 "--no-video",                           # Audio only
+                "--volume-max=100",                     # mpv clamps volume changes
                 "--input-ipc-server=" + self.socket_path,  # IPC socket
                 "--idle",                               # Don't exit when playlist ends
                 "--no-terminal",                        # Don't show terminal output
@@ -37,12 +62,17 @@ class MPVClient:
                 url
             ], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
             
-            # Wait for socket to be created
-            for _ in range(20):  # Wait up to 2 seconds
+            # Wait up to 2 seconds for the socket to be created, checking
+            # often at first since mpv usually has it up within tens of ms.
+            # A socket that exists but isn't listening yet is retried by
+            # wait_for_player_ready, so no settling delay is needed here
+            deadline = time.monotonic() + 2
+            delay = 0.005
+            while time.monotonic() < deadline and self.process.poll() is None:
                 if os.path.exists(self.socket_path):
-                    time.sleep(0.1)  # Small delay to ensure socket is ready
                     return True
-                time.sleep(0.1)
+                time.sleep(delay)
+                delay = min(delay * 1.6, 0.1)
             
             print("Warning: MPV socket not created in time")
             return False
@@ -51,48 +81,115 @@ class MPVClient:
             print(f"Error starting MPV: {e}")
             return False
     
-    def _send_command(self, command, timeout=1.0):
-        """Send IPC command to MPV"""
-        with self._socket_lock:
+    def load(self, url):
+        """
+        Play url on the running mpv (idle after the last track) instead of
+        starting a new one. Returns False if there is none to reuse.
+        """
+        if not self.is_running() or not self._run("loadfile", url, "replace"):
+            return False
+
+        # loadfile is only queued; wait for mpv to leave idle so the end of
+        # the previous track isn't taken for the end of this one
+        deadline = time.monotonic() + 1
+        while self.get_property("idle-active") and time.monotonic() < deadline:
+            time.sleep(0.005)
+        return True
+
+    def _connect(self):
+        """Open the IPC connection once and reuse it for every command"""
+        if self._sock is None:
+            if self.socket_path is None:
+                return None  # no player started (or it was stopped)
+            # Just try: a missing or not yet listening socket shows up as an
+            # error, no need to stat() it first
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
             try:
-                if not os.path.exists(self.socket_path):
-                    return None
-                
-                sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
-                sock.settimeout(timeout)
                 sock.connect(self.socket_path)
-                
-                command_json = json.dumps(command) + '\n'
-                sock.sendall(command_json.encode())
-                
-                # Read response
-                response = b''
-                while True:
-                    try:
-                        chunk = sock.recv(1024)
-                        if not chunk:
-                            break
-                        response += chunk
-                        # Check if we have a complete JSON response
-                        if b'\n' in response:
-                            break
-                    except socket.timeout:
-                        break
-                
+            except (FileNotFoundError, ConnectionRefusedError):
                 sock.close()
-                
-                if response:
-                    # Parse first complete JSON line
-                    response_str = response.decode().split('\n')[0]
-                    if response_str:
-                        return json.loads(response_str)
-                
                 return None
-                
-            except Exception as e:
+            self._sock = sock
+            self._replies = {}
+            self._props = {}
+            threading.Thread(target=self._read_replies,
+                             args=(sock, self._replies, self._props), daemon=True).start()
+
+            # From now on mpv tells us about every status change by itself
+            sock.sendall(b''.join(
+                _dump_line({"command": ["observe_property", i, name]})
+                for i, name in enumerate(_STATUS_PROPERTIES, 1)
+            ))
+        return self._sock
+
+    def _close_socket(self):
+        if self._sock is not None:
+            try:
+                # shutdown() wakes the reader thread, close() alone may not
+                self._sock.shutdown(socket.SHUT_RDWR)
+                self._sock.close()
+            except OSError:
+                pass
+        self._sock = None
+
+    def _read_replies(self, sock, replies, props):
+        """Reader thread: hand each reply to the command waiting for it"""
+        try:
+            with sock.makefile('rb') as stream:
+                for line in stream:
+                    try:
+                        message = _loads(line)
+                    except ValueError:
+                        continue
+                    if message.get('event') == 'property-change':
+                        with self._props_changed:
+                            props[message['name']] = message.get('data')
+                            self._props_changed.notify_all()
+                        continue
+                    # Other events and replies to timed-out commands have no waiter
+                    waiter = replies.pop(message.get('request_id'), None)
+                    if waiter is not None:
+                        waiter[1] = message
+                        waiter[0].set()
+        except OSError:
+            pass
+
+        # Connection is gone, don't leave anybody waiting for the timeout
+        with self._socket_lock:
+            if self._sock is sock:
+                self._close_socket()
+        for waiter in list(replies.values()):
+            waiter[0].set()
+
+    def _send_command(self, command, timeout=1.0):
+        """Send IPC command to MPV, returns its reply or None"""
+        waiter = [threading.Event(), None]
+        with self._socket_lock:
+            try:
+                sock = self._connect()
+                if sock is None:
+                    return None
+                self._next_id += 1
+                request_id = self._next_id
+                replies = self._replies
+                replies[request_id] = waiter
+                sock.sendall(_dump_line(dict(command, request_id=request_id)))
+            except OSError as e:
                 # Uncomment for debugging: print(f"IPC error: {e}")
+                self._close_socket()
                 return None
+
+        # Replies are matched by request_id, so a late one can't be taken
+        # for the reply to a later command and the connection stays usable
+        if not waiter[0].wait(timeout):
+            replies.pop(request_id, None)
+        return waiter[1]
     
+    def _run(self, *args):
+        """Run an mpv command, True on success"""
+        response = self._send_command({"command": list(args)})
+        return bool(response) and response.get("error") == "success"
+
     def get_property(self, prop):
         """Get MPV property"""
         response = self._send_command({"command": ["get_property", prop]})
@@ -102,17 +199,23 @@ class MPVClient:
     
     def set_property(self, prop, value):
         """Set MPV property"""
-        response = self._send_command({"command": ["set_property", prop, value]})
-        return response and response.get("error") == "success"
+        return self._run("set_property", prop, value)
     
     def get_status(self):
         """Get playback status"""
         try:
-            # Get all properties we need
-            pause = self.get_property("pause")
-            time_pos = self.get_property("time-pos")
-            duration = self.get_property("duration")
-            volume = self.get_property("volume")
+            # Observed properties are kept up to date by the reader thread,
+            # so this is a dict read rather than four IPC round-trips
+            with self._socket_lock:
+                try:
+                    self._connect()
+                except OSError:
+                    self._close_socket()
+            props = self._props
+            pause = props.get("pause")
+            time_pos = props.get("time-pos")
+            duration = props.get("duration")
+            volume = props.get("volume")
             
             # Determine state
             state = "paused" if pause else "playing"
@@ -134,33 +237,43 @@ class MPVClient:
                 'volume': 256
             }
     
+    def wait_for_status(self, predicate, timeout):
+        """
+        Wait until predicate(status) holds, woken by mpv's property changes
+        instead of polling. Returns the last status seen.
+        """
+        deadline = time.monotonic() + timeout
+        with self._props_changed:
+            while True:
+                status = self.get_status()
+                remaining = deadline - time.monotonic()
+                if predicate(status) or remaining <= 0:
+                    return status
+                self._props_changed.wait(remaining)
+    
     def pause(self):
         """Toggle pause/play"""
-        current_pause = self.get_property("pause")
-        if current_pause is not None:
-            return self.set_property("pause", not current_pause)
-        return False
+        return self._run("cycle", "pause")
+
+    def play(self):
+        """Resume playback (no-op if already playing)"""
+        return self.set_property("pause", False)
     
+    def change_volume(self, delta):
+        """Change volume by delta (negative to lower it)"""
+        return self._run("add", "volume", delta)
+
     def volume_up(self):
         """Increase volume by 10"""
-        current_vol = self.get_property("volume")
-        if current_vol is not None:
-            new_vol = min(100, current_vol + 10)
-            return self.set_property("volume", new_vol)
-        return False
+        return self.change_volume(10)
     
     def volume_down(self):
         """Decrease volume by 10"""
-        current_vol = self.get_property("volume")
-        if current_vol is not None:
-            new_vol = max(0, current_vol - 10)
-            return self.set_property("volume", new_vol)
-        return False
+        return self.change_volume(-10)
     
     def seek(self, seconds):
         """Seek relative to current position"""
-        response = self._send_command({"command": ["seek", seconds, "relative"]})
-        return response and response.get("error") == "success"
+        return self._run("seek", seconds, "relative")
     
     def stop(self):
         """Stop MPV"""
@@ -182,14 +295,14 @@ class MPVClient:
                 pass
         
         # Clean up socket
-        if self.socket_path and os.path.exists(self.socket_path):
-            try:
-                os.unlink(self.socket_path)
-            except:
-                pass
+        with self._socket_lock:
+            self._close_socket()
+        if self._socket_dir:
+            shutil.rmtree(self._socket_dir, ignore_errors=True)
         
         self.process = None
         self.socket_path = None
+        self._socket_dir = None
     
     def is_running(self):
         """Check if MPV is still running"""
@@ -201,6 +314,25 @@ class MPVClient:
             return self.process.wait()
         return 0
     
+    def wait_for_end(self):
+        """
+        Wait for the track to finish. mpv runs with --idle, so it goes idle
+        instead of exiting; that is watched on a connection of our own.
+        """
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+                sock.connect(self.socket_path)
+                # mpv sends the current value right away, then every change
+                sock.sendall(b'{"command": ["observe_property", 1, "idle-active"]}\n')
+                for line in sock.makefile('rb'):
+                    message = _loads(line)
+                    if message.get('event') == 'property-change' and message.get('data'):
+                        return 0
+        except (OSError, TypeError, ValueError):
+            pass
+        # Connection closed or unusable: mpv exited (or is about to)
+        return self.wait()
+
     def poll(self):
         """Check if process has terminated"""
         if self.process:
@@ -213,7 +345,9 @@ _player_client = MPVClient()
 
 # Generic player interface functions
 def start_player(url):
-    """Start audio playback"""
+    """Start audio playback, reusing the running mpv if there is one"""
+    if _player_client.load(url):
+        return _player_client
     success = _player_client.start(url)
     if success:
         return _player_client
@@ -225,12 +359,20 @@ def get_status():
 
 def control(action, value=None):
     """Control playback"""
-    if action == 'pause' or action == 'play':
+    if action == 'pause':
         return _player_client.pause()
+    elif action == 'play':
+        return _player_client.play()
     elif action == 'volume_up':
         return _player_client.volume_up()
     elif action == 'volume_down':
         return _player_client.volume_down()
+    elif action == 'volume' and value:
+        try:
+            # Relative change like "+30" or "-10"
+            return _player_client.change_volume(int(value))
+        except ValueError:
+            return False
     elif action == 'seek' and value:
         try:
             # Parse seek value like "+5" or "-5"
@@ -247,16 +389,28 @@ def force_kill_player(proc):
     else:
         _player_client.stop()
 
+def stop_player():
+    """Stop the player if one is running (e.g. idling after a song ended)"""
+    _player_client.stop()
+
 def wait_for_player_ready(max_wait=3):
-    """Wait for player to be ready"""
-    start_time = time.time()
-    while time.time() - start_time < max_wait:
-        if _player_client.socket_path and os.path.exists(_player_client.socket_path):
-            # Test if we can communicate
-            if _player_client.get_property("pause") is not None:
-                return True
-        time.sleep(0.1)
-    return False
+    """Wait for player to be ready, polling with exponential backoff from 5 ms"""
+    deadline = time.monotonic() + max_wait
+    delay = 0.005
+    while True:
+        # Test if we can communicate (fails fast while the socket is missing)
+        if _player_client.socket_path and _player_client.get_property("pause") is not None:
+            return True
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return False
+        time.sleep(min(delay, remaining))
+        delay = min(delay * 2, 0.1)
+
+def wait_for_playback(timeout=2.0):
+    """Wait until the track is playing (or paused). Returns the last status seen."""
+    return _player_client.wait_for_status(
+        lambda status: status['state'] in ('playing', 'paused'), timeout)
 
 # Legacy VLC-compatible function names for backward compatibility
 def start_vlc(url):
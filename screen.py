@@ -2,16 +2,23 @@
 """
 Screen display module - handles terminal UI, progress bars, and screen rendering
 """
+import os
+import re
 import sys
+import select
+import signal
 import termios
 import tty
 import shutil
+import threading
 import time
+import unicodedata
+from functools import lru_cache
 from colorama import Fore, Style
 
 # Import the visualizer module
 try:
-    from visualizer import AudioVisualizer
+    from visualizer import get_visualizer
     VISUALIZER_AVAILABLE = True
 except ImportError:
     VISUALIZER_AVAILABLE = False
@@ -26,59 +33,132 @@ except ImportError:
     def get_status():
         return {'time': 30, 'length': 180, 'state': 'playing', 'volume': 128}
     
-    def handle_input(stdin, proc):
+    def handle_input(stdin, proc, timeout=0):
         import select
-        if select.select([stdin], [], [], 0.1)[0]:
+        if timeout is None or select.select([stdin], [], [], timeout)[0]:
             char = stdin.read(1)
             if char.lower() == 'q':
                 return "quit"
         return None
 
+def write_all(fd, data):
+    """os.write until all of data is out (ttys may take it in pieces)"""
+    view = memoryview(data)
+    while view:
+        view = view[os.write(fd, view):]
+
+_ESCAPE = re.compile(r'\033\[[0-9;]*[A-Za-z]')
+
+@lru_cache(maxsize=256)
+def visible_width(row):
+    """Columns a row takes on screen: color codes take none, wide characters two"""
+    text = _ESCAPE.sub('', row)
+    if text.isascii():
+        return len(text)
+    return sum(2 if unicodedata.east_asian_width(c) in 'WF' else 1 for c in text)
+
+# The status only has whole seconds, so it need not be asked for every frame
+STATUS_INTERVAL = 0.25
+
+# Without a moving visualizer the screen only changes once a second, so
+# after this long without keys or state changes the loop slows down to that
+ACTIVE_PERIOD = 2.0
+IDLE_REFRESH = 1.0
+
+# Static UI text, colored/joined once at import
+_STATE_LINES = {
+    'paused': Fore.YELLOW + Style.BRIGHT + "⏸  PAUSED" + Style.RESET_ALL,
+    'playing': Fore.GREEN + Style.BRIGHT + "▶  PLAYING" + Style.RESET_ALL,
+}
+TITLE_FMT = (Fore.CYAN + Style.BRIGHT + "{}" + Style.RESET_ALL).format
+CONTROLS_TEXT = "\n".join([
+    "Press i or ↑ to increase volume",
+    "Press o or ↓ to decrease volume",
+    "Press l or → to move forwards 5s",
+    "Press k or ← to move backwards 5s",
+    "Press p to pause/unpause",
+    "Press q to quit",
+    "Press r to remove current song from your history"
+])
+
+# Every possible bar, built once and indexed instead of assembled per frame
+PROGRESS_BAR_LENGTH = 30
+VOLUME_BAR_LENGTH = 20
+_PARTIAL_CELLS = (' ', '▏', '▎', '▍', '▌', '▋', '▊', '▉')  # indexed by eighths filled
+_PROGRESS_BARS = tuple(  # indexed by eighths of a cell filled
+    ('█' * (i // 8) + _PARTIAL_CELLS[i % 8]).ljust(PROGRESS_BAR_LENGTH)[:PROGRESS_BAR_LENGTH]
+    for i in range(PROGRESS_BAR_LENGTH * 8 + 1)
+)
+_VOLUME_BARS = tuple(  # indexed by cells filled
+    '█' * i + '░' * (VOLUME_BAR_LENGTH - i) for i in range(VOLUME_BAR_LENGTH + 1)
+)
+
 class MusicPlayerScreen:
     def __init__(self, width=None, height=None):
         # Terminal settings
-        self.width = width or min(shutil.get_terminal_size().columns // 2, 100)
-        self.height = height or min(shutil.get_terminal_size().lines // 2, 20)
+        self._requested_size = (width, height)
+        self.read_terminal_size()
         
         # Visualizer setup
         self.visualizer = None
         if VISUALIZER_AVAILABLE:
-            self.visualizer = AudioVisualizer()
+            self.visualizer = get_visualizer()
         
         # Terminal state
         self.fd = None
         self.old_settings = None
+        self.old_winch_handler = None
+
+        # Rows currently on screen, used to only rewrite what changed, and
+        # whether they fitted the terminal (one line each, all on screen)
+        self._screen_rows = None
+        self._screen_fits = False
+
+        # Last status read from the player and when it was read
+        self._status = None
+        self._status_at = 0.0
+
+        # Progress line only changes when the elapsed second does
+        self._progress_key = None
+        self._progress_line = ""
+
+        # What the last frame showed, to skip frames that would be the same
+        self._frame_key = None
         
     def setup_terminal(self):
         """Setup terminal for non-blocking input"""
         self.fd = sys.stdin.fileno()
         self.old_settings = termios.tcgetattr(self.fd)
         tty.setcbreak(self.fd)
+
+        # Rows are only rewritten when they change, so after a resize the
+        # whole frame has to be repainted once
+        self.old_winch_handler = signal.signal(signal.SIGWINCH, self._on_resize)
         
     def restore_terminal(self):
         """Restore original terminal settings"""
         if self.fd and self.old_settings:
             termios.tcsetattr(self.fd, termios.TCSADRAIN, self.old_settings)
+        if self.old_winch_handler is not None:
+            signal.signal(signal.SIGWINCH, self.old_winch_handler)
+            self.old_winch_handler = None
+
+    def read_terminal_size(self):
+        """Take the terminal size, and the layout sizes derived from it"""
+        self.term_size = shutil.get_terminal_size()
+        width, height = self._requested_size
+        self.width = width or min(self.term_size.columns // 2, 100)
+        self.height = height or min(self.term_size.lines // 2, 20)
+
+    def _on_resize(self, signum, frame):
+        """SIGWINCH handler: repaint everything on the next frame"""
+        self.read_terminal_size()
+        self.clear_screen()
             
     def display_progress(self, duration, elapsed, percent):
         """Generate progress bar display"""
-        bar_length = 30
-        exact_pos = bar_length * percent / 100
-        whole = int(exact_pos)
-        frac = exact_pos - whole
-        
-        # Build progress bar with fractional characters
-        bar = '█' * whole
-        if frac > 0:
-            if frac <= 0.125: bar += ' '
-            elif frac <= 0.25:  bar += '▏'
-            elif frac <= 0.375: bar += '▎'
-            elif frac <= 0.5:   bar += '▍'
-            elif frac <= 0.625: bar += '▌'
-            elif frac <= 0.75:  bar += '▋'
-            elif frac <= 0.875: bar += '▊'
-            else:               bar += '▉'
-        bar += ' ' * (bar_length - len(bar))
+        eighths = int(PROGRESS_BAR_LENGTH * 8 * percent / 100)
+        bar = _PROGRESS_BARS[min(eighths, PROGRESS_BAR_LENGTH * 8)]
         
         # Format time displays
         elapsed_min, elapsed_sec = divmod(int(elapsed), 60)
@@ -91,38 +171,26 @@ class MusicPlayerScreen:
     def display_volume(self, volume):
         """Generate volume bar display"""
         vol_percent = int((volume / 256) * 100)
-        bar_length = 20
-        filled = int(bar_length * min(100, vol_percent) / 100)
-        vol_bar = '█' * filled + '░' * (bar_length - filled)
+        vol_bar = _VOLUME_BARS[int(VOLUME_BAR_LENGTH * min(100, vol_percent) / 100)]
         suffix = " (AMPLIFIED)" if vol_percent > 100 else ""
         return f'[{vol_bar}] {vol_percent}%{suffix} VOL'
 
     def display_playback_state(self, state):
         """Generate playback state display with colors"""
-        if state == 'paused':
-            return Fore.YELLOW + Style.BRIGHT + "⏸  PAUSED" + Style.RESET_ALL
-        elif state == 'playing':
-            return Fore.GREEN + Style.BRIGHT + "▶  PLAYING" + Style.RESET_ALL
-        else:
-            return Fore.RED + Style.BRIGHT + f"State: {state}" + Style.RESET_ALL
+        line = _STATE_LINES.get(state)
+        if line is None:
+            line = Fore.RED + Style.BRIGHT + f"State: {state}" + Style.RESET_ALL
+        return line
 
     def display_title(self, title):
         """Generate title display with formatting"""
         if title:
-            return Fore.CYAN + Style.BRIGHT + title + Style.RESET_ALL
+            return TITLE_FMT(title)
         return ""
 
     def display_controls(self):
         """Generate controls help text"""
-        return "\n".join([
-            "Press i or ↑ to increase volume",
-            "Press o or ↓ to decrease volume", 
-            "Press l or → to move forwards 5s",
-            "Press k or ← to move backwards 5s",
-            "Press p to pause/unpause",
-            "Press q to quit",
-            "Press r to remove current song from your history"
-        ])
+        return CONTROLS_TEXT
 
     def display_visualizer(self, state, num_bars=None, max_height=None):
         """Generate visualizer display"""
@@ -142,9 +210,54 @@ class MusicPlayerScreen:
         else:
             return Fore.MAGENTA + "Audio Visualizer: (paused)" + Style.RESET_ALL
 
+    def visualizer_active(self, state):
+        """Whether the visualizer is animating, which needs every frame drawn"""
+        return (self.visualizer is not None and state == 'playing'
+                and self.visualizer.is_audio_available())
+
     def clear_screen(self):
-        """Clear screen and move cursor to top"""
-        sys.stdout.write('\033[2J\033[H')
+        """Clear screen and move cursor to top on the next frame"""
+        self._screen_rows = None
+
+    def input_pending(self):
+        """Check whether a keypress is waiting on stdin"""
+        return bool(select.select([sys.stdin], [], [], 0)[0])
+
+    def draw_rows(self, rows):
+        """Rewrite only the rows that differ from what is on screen"""
+        # Rows are addressed by their screen line, which only works while
+        # each fits on one line and the frame (plus the line the cursor is
+        # parked on) fits on the screen. Otherwise the whole frame is printed
+        # and the terminal left to wrap and scroll it
+        columns, lines = self.term_size
+        fits = len(rows) < lines and all(visible_width(row) <= columns for row in rows)
+
+        out = []
+        previous = self._screen_rows
+        if previous is None or not fits or not self._screen_fits:
+            out.append('\033[H\033[J')  # home + clear to end, no full clear flicker
+            previous = []
+
+        if not fits:
+            out.append('\n'.join(rows) + '\n')
+        else:
+            for i, row in enumerate(rows):
+                if i >= len(previous) or previous[i] != row:
+                    out.append(f'\033[{i + 1};1H{row}\033[K')
+            if len(rows) < len(previous):
+                # Frame got shorter, wipe the leftovers
+                out.append(f'\033[{len(rows) + 1};1H\033[J')
+            if not out:
+                return
+
+            # Park the cursor below the frame so later output lands there
+            out.append(f'\033[{len(rows) + 1};1H')
+
+        # Whole frame goes out in a single write, past Python's stdout layers
+        sys.stdout.flush()
+        write_all(sys.stdout.fileno(), ''.join(out).encode())
+        self._screen_rows = rows
+        self._screen_fits = fits
 
     def render_frame(self, status, title=None, show_visualizer=True):
         """Render a complete screen frame"""
@@ -155,8 +268,13 @@ class MusicPlayerScreen:
         volume = status['volume'] if status else 128
         percent = min(100, (elapsed / duration * 100)) if duration > 0 else 0
 
-        # Clear screen
-        self.clear_screen()
+        # Unless the visualizer is moving, a frame only differs from the one
+        # on screen when one of these does
+        frame_key = (elapsed, duration, state, volume, title, show_visualizer)
+        if (frame_key == self._frame_key and self._screen_rows is not None
+                and not (show_visualizer and self.visualizer_active(state))):
+            return
+        self._frame_key = frame_key
 
         # Build screen content
         content = []
@@ -171,7 +289,10 @@ class MusicPlayerScreen:
 
         # Progress and volume
         content.append("")  # Empty line
-        content.append(self.display_progress(duration, elapsed, percent))
+        if (elapsed, duration) != self._progress_key:
+            self._progress_key = (elapsed, duration)
+            self._progress_line = self.display_progress(duration, elapsed, percent)
+        content.append(self._progress_line)
         content.append(self.display_volume(volume))
 
         # Visualizer
@@ -184,11 +305,15 @@ class MusicPlayerScreen:
         content.append(self.display_controls())
         content.append("")  # Empty line
 
-        # Print all content
-        for line in content:
-            print(line)
+        # Only the rows that changed since the last frame are written
+        self.draw_rows("\n".join(content).split("\n"))
 
-        sys.stdout.flush()
+    def poll_status(self, now):
+        """Player status, asked for at most every STATUS_INTERVAL seconds"""
+        if self._status is None or now - self._status_at >= STATUS_INTERVAL:
+            self._status = get_status()
+            self._status_at = now
+        return self._status
 
     def run_display_loop(self, vlc_proc, title=None, refresh_rate=0.05):
         """Main display loop"""
@@ -198,25 +323,80 @@ class MusicPlayerScreen:
         if self.visualizer:
             self.visualizer.start_capture()
 
+        # A helper thread blocks until the track is over (mpv goes idle or
+        # exits) so the loop needn't ask for it every frame; it wakes the
+        # loop through a pipe, so a long idle wait doesn't delay the exit
+        wait = getattr(vlc_proc, 'wait_for_end', vlc_proc.wait)
+        exited = threading.Event()
+        wake_r, wake_w = os.pipe()
+        wake_lock = threading.Lock()  # the pipe may only be written while open
+
+        def watch():
+            wait()
+            with wake_lock:
+                if not exited.is_set():
+                    exited.set()
+                    os.write(wake_w, b'x')
+
+        threading.Thread(target=watch, daemon=True).start()
+
         try:
-            while vlc_proc.poll() is None:
+            active_key = None
+            active_until = 0.0
+            next_frame = 0.0
+            while not exited.is_set():
                 # Get current status
-                status = get_status()
+                now = time.monotonic()
+                status = self.poll_status(now)
+                state = status['state'] if status else 'unknown'
+
+                # A state or volume change counts as activity, the clock ticking doesn't
+                key = (state, status['volume'] if status else None)
+                if key != active_key:
+                    active_key = key
+                    active_until = now + ACTIVE_PERIOD
                 
-                # Render frame
-                self.render_frame(status, title, show_visualizer=True)
+                # Render frame, unless keys are queued up: handle those first
+                # so a slow terminal can't starve input
+                if not self.input_pending():
+                    self.render_frame(status, title, show_visualizer=True)
 
-                # Handle input
+                # Wait for the next frame on stdin so a keypress is acted on
+                # immediately; only the visualizer needs the full rate once
+                # things have been quiet for a while
+                interval = refresh_rate
+                if not self.visualizer_active(state) and now > active_until:
+                    interval = IDLE_REFRESH
+
+                # Frames follow a fixed schedule, so time spent rendering
+                # doesn't stretch the interval (no catching up after a stall)
+                if now >= next_frame:
+                    next_frame += interval
+                    if next_frame <= now:
+                        next_frame = now + interval
+                timeout = max(0.0, next_frame - time.monotonic())
+                ready = select.select([sys.stdin, wake_r], [], [], timeout)[0]
 
-                error = handle_input(sys.stdin, vlc_proc)
-                if error:
-                   self.restore_terminal()
-                   return error; 
+                # Handle input
+                if sys.stdin in ready:
+                    active_until = time.monotonic() + ACTIVE_PERIOD
+                    # select() just said there is input, don't ask again
+                    error = handle_input(sys.stdin, vlc_proc, None)
+                    if error:
+                       self.restore_terminal()
+                       return error; 
 
-                # Control refresh rate
-                time.sleep(refresh_rate)
+                    # Show the effect of the key (volume, seek, pause) on the
+                    # next frame rather than when the cached status expires,
+                    # and leave the idle rate right away
+                    self._status = None
+                    next_frame = min(next_frame, time.monotonic() + refresh_rate)
 
         finally:
+            with wake_lock:
+                exited.set()  # tells the helper thread the pipe is gone
+                os.close(wake_r)
+                os.close(wake_w)
             self.restore_terminal()
             if self.visualizer:
                 self.visualizer.stop_capture()
@@ -253,6 +433,10 @@ if __name__ == "__main__":
                 return 1
             return None
 
+        def wait(self):
+            time.sleep(max(0, self.start_time + 10 - time.time()))
+            return 1
+
     print("Testing music player screen...")
     print("Will auto-quit in 10 seconds or press 'q' to quit")
     
@@ -15,8 +15,8 @@ def test_mpv():
         from get_audio_url import get_audio_url
         
         # Get YouTube URL
-        result = get_audio_url("test song", with_title=True, with_duration=True)
-        if not result or not result[0]:
+        result = get_audio_url("test song")
+        if not result.url:
             print("Could not get YouTube URL")
             return False
             
@@ -2,10 +2,9 @@
 """
 Audio visualizer module - handles real-time audio capture and FFT visualization
 """
+import atexit
 import numpy as np
-import threading
 import time
-import queue
 from colorama import Fore, Style
 
 try:
@@ -14,82 +13,132 @@ try:
 except ImportError:
     PYAUDIO_AVAILABLE = False
 
+# Source of the fallback animation
+_RNG = np.random.default_rng()
+
 class AudioVisualizer:
-    def __init__(self, sample_rate=44100, chunk_size=1024, max_queue_size=10):
+    def __init__(self, sample_rate=44100, chunk_size=1024):
         self.sample_rate = sample_rate
         self.chunk_size = chunk_size
-        self.audio_data_queue = queue.Queue(maxsize=max_queue_size)
-        self.capture_thread = None
-        self.stop_event = threading.Event()
+
+        # Only the newest chunk matters for drawing; each one replaces the
+        # last. Only the audio callback assigns _latest and only the renderer
+        # assigns _taken, and a reference assignment is atomic, so no lock
+        self._latest = None
+        self._taken = None
         self.is_running = False
+
+        # Opened on the first start_capture and kept open between songs
+        self._pyaudio = None
+        self._stream = None
+
+        # Windowed DFT rows for the displayed bins, built for a given
+        # (chunk length, num_bars) and reused every frame, and which row
+        # each bar shows (low bars repeat bins)
+        self._dft_key = None
+        self._dft = None
+        self._bar_bins = None
+
+        # Per-frame results are written into these, sized with the matrix:
+        # cos/sin products, bin magnitudes and bar heights
+        self._parts = None
+        self._mags = None
+        self._heights = None
+
+        # (row, color, reset) for each row of the bars, top row first, built
+        # for a given (max_height, use_colors)
+        self._cells_key = None
+        self._cells = None
         
     def start_capture(self):
-        """Start audio capture in a separate thread"""
+        """Start (or resume) audio capture; PortAudio calls _on_audio per chunk"""
         if not PYAUDIO_AVAILABLE:
             return False
             
         if self.is_running:
             return True
             
-        self.stop_event.clear()
-        self.capture_thread = threading.Thread(target=self._capture_audio, daemon=True)
-        self.capture_thread.start()
+        self._taken = self._latest  # left over from the last song
+        try:
+            if self._stream is None:
+                # Opened once: negotiating the device again for every song is slow
+                self._pyaudio = pyaudio.PyAudio()
+                self._stream = self._pyaudio.open(
+                    format=pyaudio.paInt16,
+                    channels=1,
+                    rate=self.sample_rate,
+                    input=True,
+                    frames_per_buffer=self.chunk_size,
+                    stream_callback=self._on_audio
+                )
+            else:
+                self._stream.start_stream()
+        except Exception as e:
+            print(f"Audio initialization error: {e}")
+            self.close()
+            return False
+
         self.is_running = True
         return True
         
     def stop_capture(self):
-        """Stop audio capture thread"""
-        self.stop_event.set()
-        self.is_running = False
-        if self.capture_thread and self.capture_thread.is_alive():
-            self.capture_thread.join(timeout=1)
-            
-    def _capture_audio(self):
-        """Audio capture thread function"""
+        """Pause audio capture; the stream stays open for the next start"""
+        if self.is_running:
+            self._stream.stop_stream()
+            self.is_running = False
+
+    def close(self):
+        """Stop audio capture and release the audio device"""
         try:
-            p = pyaudio.PyAudio()
-            
-            stream = p.open(
-                format=pyaudio.paInt16,
-                channels=1,
-                rate=self.sample_rate,
-                input=True,
-                frames_per_buffer=self.chunk_size
-            )
+            if self._stream is not None:
+                self._stream.close()
+            if self._pyaudio is not None:
+                self._pyaudio.terminate()
+        except Exception:
+            pass
+        self._stream = None
+        self._pyaudio = None
+        self.is_running = False
             
-            while not self.stop_event.is_set():
-                try:
-                    data = stream.read(self.chunk_size, exception_on_overflow=False)
-                    audio_array = np.frombuffer(data, dtype=np.int16).astype(np.float32)
-                    
-                    # Non-blocking queue put
-                    try:
-                        self.audio_data_queue.put_nowait(audio_array)
-                    except queue.Full:
-                        # Remove old data and add new
-                        try:
-                            self.audio_data_queue.get_nowait()
-                            self.audio_data_queue.put_nowait(audio_array)
-                        except queue.Empty:
-                            pass
-                            
-                except Exception as e:
-                    print(f"Audio capture error: {e}")
-                    break
-                    
-            stream.stop_stream()
-            stream.close()
-            p.terminate()
-            
-        except Exception as e:
-            print(f"Audio thread initialization error: {e}")
+    def _on_audio(self, in_data, frame_count, time_info, status):
+        """PortAudio callback (its own thread): publish the chunk for drawing"""
+        self._latest = np.frombuffer(in_data, dtype=np.int16).astype(np.float32)
+        return None, pyaudio.paContinue
             
     def get_latest_audio_data(self):
-        """Get the most recent audio data for visualization"""
-        try:
-            return self.audio_data_queue.get_nowait()
-        except queue.Empty:
+        """Get the most recent audio data for visualization (None if no new data)"""
+        data = self._latest
+        if data is self._taken:
             return None
+        self._taken = data
+        return data
+            
+    def _dft_matrix(self, n, num_bars):
+        """
+        Hanning-windowed cos/sin rows for the distinct log-spaced bins of an
+        n-sample rfft, stacked as one (2 * bins, n) float32 matrix, and the
+        index of the bin each of the num_bars bars shows
+        """
+        if self._dft_key != (n, num_bars):
+            n_freqs = n // 2 + 1
+            if n_freqs > num_bars:
+                # Logarithmically spaced frequency bins; at the low end
+                # several bars land on the same bin, which is computed once
+                bins, self._bar_bins = np.unique(
+                    np.logspace(0, np.log10(n_freqs - 1), num_bars).astype(int),
+                    return_inverse=True)
+            else:
+                bins = np.arange(n_freqs)
+                self._bar_bins = bins
+            phase = 2 * np.pi * np.outer(bins, np.arange(n)) / n
+            window = np.hanning(n)
+            self._dft = np.vstack([np.cos(phase) * window,
+                                   np.sin(phase) * window]).astype(np.float32)
+            self._parts = np.empty(2 * len(bins), dtype=np.float32)
+            self._mags = np.empty(len(bins), dtype=np.float32)
+            self._heights = np.empty(len(self._bar_bins), dtype=np.float32)
+            self._dft_key = (n, num_bars)
+        return self._dft, self._bar_bins
             
     def generate_fft_bars(self, audio_data, num_bars=20, max_height=8):
         """Generate FFT-based visualization bars from audio data"""
@@ -97,60 +146,61 @@ class AudioVisualizer:
             return [0] * num_bars
             
         try:
-            # Apply window function
-            windowed = audio_data * np.hanning(len(audio_data))
-            
-            # FFT
-            fft_vals = np.abs(np.fft.rfft(windowed))
-            
-            # Logarithmically spaced frequency bins
-            if len(fft_vals) > num_bars:
-                indices = np.logspace(0, np.log10(len(fft_vals)-1), num_bars).astype(int)
-                fft_vals = fft_vals[indices]
-            else:
-                fft_vals = fft_vals[:num_bars]
+            # Only the displayed bins are needed, so rather than a full rfft
+            # (window, transform, abs, then pick the bins) compute just those
+            # with one matrix product; the window is folded into the matrix.
+            # Every step writes into the buffers kept with the matrix
+            dft, bar_bins = self._dft_matrix(len(audio_data), num_bars)
+            parts = np.matmul(dft, audio_data, out=self._parts)
+            bins = len(parts) // 2
+            np.hypot(parts[:bins], parts[bins:], out=self._mags)
+            fft_vals = np.take(self._mags, bar_bins, out=self._heights)
                 
             # Apply log scaling for better dynamics
-            fft_vals = np.log1p(fft_vals)
+            np.log1p(fft_vals, out=fft_vals)
             
             # Normalize to max_height
-            if np.max(fft_vals) > 0:
-                fft_vals = (fft_vals / np.max(fft_vals)) * max_height
+            peak = fft_vals.max()
+            if peak > 0:
+                fft_vals /= peak
+                fft_vals *= max_height
                 
-            return [int(val) for val in fft_vals]
+            # Truncates like int() did, in one call instead of one per bar
+            return fft_vals.astype(np.int32).tolist()
             
         except Exception as e:
             print(f"FFT error: {e}")
             return [0] * num_bars
             
-    def render_bars_ascii(self, bars, max_height=8, use_colors=True):
-        """Render visualization bars as ASCII art"""
-        lines = []
-        
-        for row in reversed(range(max_height)):
-            line = ''
-            for bar_height in bars:
-                if bar_height > row:
-                    if use_colors:
-                        # Color coding based on frequency range
-                        if row < max_height // 3:
-                            line += Fore.RED + '█' + Style.RESET_ALL + ' '
-                        elif row < 2 * max_height // 3:
-                            line += Fore.YELLOW + '█' + Style.RESET_ALL + ' '
-                        else:
-                            line += Fore.GREEN + '█' + Style.RESET_ALL + ' '
-                    else:
-                        line += '█ '
+    def _bar_cells(self, max_height, use_colors):
+        """Color codes for every row; a row has a single color"""
+        if self._cells_key != (max_height, use_colors):
+            cells = []
+            for row in reversed(range(max_height)):
+                if not use_colors:
+                    cells.append((row, '', ''))
+                # Color coding based on frequency range
+                elif row < max_height // 3:
+                    cells.append((row, Fore.RED, Style.RESET_ALL))
+                elif row < 2 * max_height // 3:
+                    cells.append((row, Fore.YELLOW, Style.RESET_ALL))
                 else:
-                    line += '  '
-            lines.append(line)
+                    cells.append((row, Fore.GREEN, Style.RESET_ALL))
+            self._cells = cells
+            self._cells_key = (max_height, use_colors)
+        return self._cells
             
-        return '\n'.join(lines)
+    def render_bars_ascii(self, bars, max_height=8, use_colors=True):
+        """Render visualization bars as ASCII art"""
+        # One color code per row instead of one per filled cell
+        return '\n'.join(
+            color + ''.join('█ ' if bar_height > row else '  ' for bar_height in bars) + reset
+            for row, color, reset in self._bar_cells(max_height, use_colors)
+        )
         
     def generate_fake_bars(self, num_bars=20, max_height=8):
         """Generate fake animated bars for testing/fallback"""
-        import random
-        return [random.randint(0, max_height) for _ in range(num_bars)]
+        return _RNG.integers(0, max_height + 1, size=num_bars, dtype=np.int32).tolist()
         
     def get_visualization(self, num_bars=20, max_height=8, use_colors=True, fallback_mode=False):
         """Get complete visualization string"""
@@ -178,18 +228,23 @@ class AudioVisualizer:
         
     def __exit__(self, exc_type, exc_val, exc_tb):
         """Context manager exit"""
-        self.stop_capture()
+        self.close()
 
 
 # Convenience functions for backward compatibility
 _global_visualizer = None
 
-def start_audio_capture():
-    """Start global audio capture"""
+def get_visualizer():
+    """Return the process-wide visualizer, whose audio stream outlives a song"""
     global _global_visualizer
     if _global_visualizer is None:
         _global_visualizer = AudioVisualizer()
-    return _global_visualizer.start_capture()
+        atexit.register(_global_visualizer.close)
+    return _global_visualizer
+
+def start_audio_capture():
+    """Start global audio capture"""
+    return get_visualizer().start_capture()
 
 def stop_audio_capture():
     """Stop global audio capture"""
@@ -199,12 +254,9 @@ def stop_audio_capture():
 
 def draw_visualizer(num_bars=20, max_height=8):
     """Draw visualizer using global instance (for backward compatibility)"""
-    global _global_visualizer
-    if _global_visualizer is None:
-        _global_visualizer = AudioVisualizer()
-        _global_visualizer.start_capture()
-    
-    return _global_visualizer.get_visualization(num_bars, max_height)
+    visualizer = get_visualizer()
+    visualizer.start_capture()
+    return visualizer.get_visualization(num_bars, max_height)
 
 
 # Test the visualizer if run directly